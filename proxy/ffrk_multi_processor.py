@@ -6,16 +6,26 @@ Automatically intercepts FFRK API responses and generates CSV files for multiple
 Usage:
     mitmproxy -s ffrk_multi_processor.py
     mitmdump -s ffrk_multi_processor.py
+
+Set ENABLE_DIRECT_MERGE to merge captured soul breaks straight into
+data/items.json and data/items.bin instead of going through merge_data.py.
+In that mode soul break pages are finalized DIRECT_MERGE_TIMEOUT seconds after
+the last page (checked every FINALIZE_POLL_INTERVAL seconds), so new ownership
+lands in the site data in well under a second once browsing stops. Other data
+keeps ACCUMULATION_TIMEOUT. This mode needs the repo's scripts/ and data/all.bin.
 """
 
+import asyncio
 import json
 import csv
+import os
 import re
+import sys
 from collections import defaultdict
 from datetime import datetime
 from mitmproxy import http
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict, List
 
 
 # Character name translation dictionary (Japanese to English)
@@ -119,6 +129,13 @@ ACCUMULATION_TIMEOUT = 5  # seconds - time to wait after last response before fi
 ENABLE_AUTO_SAVE = True   # Auto-save after timeout
 ENABLE_PAGE_TRACKING = True  # Save individual pages as backup
 
+# Direct merge settings
+ENABLE_DIRECT_MERGE = False  # Merge finalized soul breaks into the site data
+DIRECT_MERGE_TIMEOUT = 0.5   # seconds - replaces ACCUMULATION_TIMEOUT for soul breaks when merging directly
+FINALIZE_POLL_INTERVAL = 0.25  # seconds - how often pending endpoints are checked
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+
 
 # =============================================================================
 # HELPER FUNCTIONS
@@ -298,17 +315,27 @@ class PaginationManager:
         self.accumulated_data: Dict[str, Dict[str, List]] = defaultdict(lambda: defaultdict(list))
         self.last_update_time: Dict[str, float] = {}
         self.page_counts: Dict[str, int] = defaultdict(int)
+        self.headers: Dict[str, Dict[str, List[str]]] = defaultdict(dict)
         
-    def add_page(self, endpoint: str, processor_name: str, items: List[Dict]):
+    def add_page(self, endpoint: str, processor_name: str, items: List[Dict], headers: List[str]):
         """Add a page of data for a specific endpoint and processor"""
         self.accumulated_data[endpoint][processor_name].extend(items)
+        self.headers[endpoint][processor_name] = headers
         self.last_update_time[endpoint] = datetime.now().timestamp()
         self.page_counts[endpoint] += 1
+    
+    def has_accumulated(self, endpoint: str, processor_name: str) -> bool:
+        """Check whether an endpoint has pending data for a processor"""
+        return bool(self.accumulated_data.get(endpoint, {}).get(processor_name))
         
     def get_accumulated(self, endpoint: str, processor_name: str) -> List[Dict]:
         """Get all accumulated data for an endpoint and processor"""
         return self.accumulated_data[endpoint][processor_name]
     
+    def get_headers(self, endpoint: str, processor_name: str) -> List[str]:
+        """Get the CSV headers the processor produced for an endpoint"""
+        return self.headers[endpoint][processor_name]
+    
     def should_finalize(self, endpoint: str, timeout: float = ACCUMULATION_TIMEOUT) -> bool:
         """Check if enough time has passed since last update to finalize"""
         if endpoint not in self.last_update_time:
@@ -325,6 +352,8 @@ class PaginationManager:
             del self.last_update_time[endpoint]
         if endpoint in self.page_counts:
             del self.page_counts[endpoint]
+        if endpoint in self.headers:
+            del self.headers[endpoint]
     
     def get_page_count(self, endpoint: str) -> int:
         """Get number of pages received for an endpoint"""
@@ -343,6 +372,9 @@ class FFRKMultiProcessorAddon:
         self.total_processed = 0
         self.pagination_manager = PaginationManager()
         self.pending_endpoints = set()
+        self.sb_details = None
+        self.sb_details_stat = None
+        self.finalize_task = None
         
     def get_endpoint_key(self, flow: http.HTTPFlow) -> str:
         """Generate a consistent key for an endpoint"""
@@ -377,7 +409,7 @@ class FFRKMultiProcessorAddon:
                         if processor_class.is_paginated():
                             # PAGINATED: Accumulate data
                             has_paginated_data = True
-                            self.pagination_manager.add_page(endpoint, processor_name, items)
+                            self.pagination_manager.add_page(endpoint, processor_name, items, headers)
                             self.pending_endpoints.add(endpoint)
                             
                             page_count = self.pagination_manager.get_page_count(endpoint)
@@ -419,7 +451,7 @@ class FFRKMultiProcessorAddon:
                 for info in page_info:
                     print(f"  {info["type"]:25s}: +{info["page_items"]:4d} items  (Total: {info["total_items"]:4d} across {info["pages"]} pages)")
                 print(f"{"="*60}")
-                print(f"Waiting for more pages... (will auto-save after {ACCUMULATION_TIMEOUT}s of inactivity)")
+                print(f"Waiting for more pages... (will auto-save after {self.finalize_timeout(endpoint)}s of inactivity)")
                 print(f"{"="*60}\n")
             
             # Check if any pending endpoints should be finalized
@@ -438,12 +470,32 @@ class FFRKMultiProcessorAddon:
         except Exception as e:
             print(f"Error processing FFRK data: {e}")
     
+    def finalize_timeout(self, endpoint: str) -> float:
+        """Seconds of inactivity before a paginated endpoint is finalized"""
+        if ENABLE_DIRECT_MERGE and self.pagination_manager.has_accumulated(endpoint, SoulBreaksProcessor.__name__):
+            return DIRECT_MERGE_TIMEOUT
+        return ACCUMULATION_TIMEOUT
+    
+    def running(self):
+        """Called when mitmproxy is up; in direct merge mode, start polling pending endpoints"""
+        if ENABLE_AUTO_SAVE and ENABLE_DIRECT_MERGE:
+            self.finalize_task = asyncio.get_running_loop().create_task(self.finalize_loop())
+    
+    async def finalize_loop(self):
+        """Finalize pending endpoints even when no further responses arrive"""
+        while True:
+            await asyncio.sleep(FINALIZE_POLL_INTERVAL)
+            try:
+                self.check_and_finalize_pending()
+            except Exception as e:
+                print(f"Error finalizing pending data: {e}")
+    
     def check_and_finalize_pending(self):
         """Check pending endpoints and finalize if timeout reached"""
         endpoints_to_finalize = []
         
         for endpoint in self.pending_endpoints:
-            if self.pagination_manager.should_finalize(endpoint):
+            if self.pagination_manager.should_finalize(endpoint, self.finalize_timeout(endpoint)):
                 endpoints_to_finalize.append(endpoint)
         
         for endpoint in endpoints_to_finalize:
@@ -451,7 +503,8 @@ class FFRKMultiProcessorAddon:
     
     def finalize_endpoint(self, endpoint: str):
         """Finalize and save accumulated data for an endpoint"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Direct merge can finalize several batches a second; keep their CSVs apart
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f" if ENABLE_DIRECT_MERGE else "%Y%m%d_%H%M%S")
         
         print(f"\n{"="*60}")
         print(f"✅ FINALIZING ACCUMULATED DATA")
@@ -464,16 +517,15 @@ class FFRKMultiProcessorAddon:
             processor_name = processor_class.__name__
             accumulated_items = self.pagination_manager.get_accumulated(endpoint, processor_name)
             
-            if accumulated_items:
+            if not accumulated_items:
+                continue
+            
+            try:
                 # Deduplicate by ID
                 unique_items = deduplicate_by_id(accumulated_items)
                 
-                # Process the accumulated data
-                _, headers = processor_class.process({"temp_key": unique_items})
-                if not headers:
-                    # Get headers from the processor
-                    dummy_data = {processor_name.replace("Processor", "").lower() + "s": unique_items[:1]}
-                    _, headers = processor_class.process(dummy_data)
+                # Items were already processed page by page; reuse their headers
+                headers = self.pagination_manager.get_headers(endpoint, processor_name)
                 
                 # Save final CSV
                 output_file = processor_class.get_filename(timestamp)
@@ -484,8 +536,14 @@ class FFRKMultiProcessorAddon:
                 
                 print(f"  {clean_name:25s}: {len(unique_items):4d} items from {page_count} pages → {output_file.name}")
                 
+                if ENABLE_DIRECT_MERGE and processor_class is SoulBreaksProcessor:
+                    self.merge_soul_breaks(unique_items)
+                
                 self.stats[processor_class.__name__] += 1
                 self.total_processed += 1
+            
+            except Exception as e:
+                print(f"Error in {processor_name}: {e}")
         
         print(f"{"="*60}\n")
         
@@ -493,6 +551,36 @@ class FFRKMultiProcessorAddon:
         self.pagination_manager.finalize(endpoint)
         self.pending_endpoints.discard(endpoint)
     
+    def merge_soul_breaks(self, items: List[Dict[str, Any]]):
+        """Merge owned soul break ids into the holdings dataset"""
+        try:
+            # Only direct merge needs the repo's scripts, so the addon still runs standalone
+            if str(SCRIPTS_DIR) not in sys.path:
+                sys.path.insert(0, str(SCRIPTS_DIR))
+            from merge_data import update_holdings
+            
+            sb_details = self.load_sb_details()
+            
+            ids = [item["id"] for item in items if item.get("character")]
+            added = update_holdings(ids, sb_details, DATA_DIR / "items.json", DATA_DIR / "items.bin")
+            print(f"  {"Merged into items.json":25s}: {added:4d} new items")
+        except Exception as e:
+            print(f"Error merging soul breaks: {e}")
+    
+    def load_sb_details(self):
+        """Return the cached details table, reopening it if merge_data.py replaced all.bin"""
+        from sb_dataset import load_dataset
+        
+        stat = os.stat(DATA_DIR / "all.bin")
+        stat_key = (stat.st_ino, stat.st_mtime_ns)
+        if self.sb_details is None or stat_key != self.sb_details_stat:
+            if self.sb_details is not None:
+                self.sb_details.close()
+                self.sb_details = None
+            self.sb_details = load_dataset(DATA_DIR / "all.bin")
+            self.sb_details_stat = stat_key
+        return self.sb_details
+    
     def is_ffrk_api(self, flow: http.HTTPFlow) -> bool:
         """Determine if this is an FFRK API request"""
         url = flow.request.pretty_url
@@ -507,6 +595,10 @@ class FFRKMultiProcessorAddon:
     
     def done(self):
         """Called when mitmproxy shuts down"""
+        if self.finalize_task is not None:
+            self.finalize_task.cancel()
+            self.finalize_task = None
+        
         # Finalize any remaining pending endpoints
         for endpoint in list(self.pending_endpoints):
             self.finalize_endpoint(endpoint)
@@ -521,6 +613,10 @@ class FFRKMultiProcessorAddon:
                     clean_name = processor_name.replace("Processor", "")
                     print(f"  {clean_name:30s}: {count} times")
             print(f"{"="*60}\n")
+        
+        if self.sb_details is not None:
+            self.sb_details.close()
+            self.sb_details = None
 
 
 # Create the addon instance
@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 """
 Merge ownership data (from mitmproxy) with item details (from Google Sheets)
-Outputs a single JSON file for Zola to consume
+Outputs a single JSON file for Zola to consume, plus binary copies for tools
+
+Holdings already in data/items.json (e.g. merged directly by the proxy addon)
+are kept on top of data/raw/sbs*.csv; delete items.json to rebuild from the CSVs alone
 """
 import json
 import csv
+import os
 import re
 from pathlib import Path
 
+from sb_dataset import dump_dataset, write_dataset
+
 pattern = r'\s*(?:,\s*(?:and|or)\s*|,\s*|/\s*|\s+(?:and|or)\s+)\s*'
 
 def load_sb_holding_data(filepath):
@@ -48,6 +54,13 @@ def load_sb_details(filepath):
             }
     return sbs
 
+def load_held_ids(filepath):
+    """Load sb ids from an existing holdings JSON, including ones merged directly by the proxy"""
+    if not filepath.exists():
+        return []
+    with open(filepath, "r", encoding="utf-8") as f:
+        return [sb["id"] for sb in json.load(f)["items"] if sb]
+
 def merge_data(sb_holdings, sb_details):
     """Merge sb holdings with sb details"""
     merged = []
@@ -59,6 +72,7 @@ def merge_data(sb_holdings, sb_details):
         if not details:
             print(f"warning: id not found: {id}")
             missing_detail_ids.add(id)
+            continue
         merged.append(details)
     
     if missing_detail_ids:
@@ -66,6 +80,49 @@ def merge_data(sb_holdings, sb_details):
     
     return merged
 
+def update_holdings(new_ids, sb_details, output_file, output_bin):
+    """Add newly captured sb ids to an existing holdings dataset, replacing files atomically"""
+    items = []
+    if output_file.exists():
+        with open(output_file, "r", encoding="utf-8") as f:
+            items = [sb for sb in json.load(f)["items"] if sb]
+    held_ids = {sb["id"] for sb in items}
+
+    added = 0
+    for id in new_ids:
+        id = str(id)
+        if id in held_ids:
+            continue
+        details = sb_details.get(id)
+        if not details:
+            print(f"warning: id not found: {id}")
+            continue
+        items.append(dict(details))
+        held_ids.add(id)
+        added += 1
+
+    if added:
+        write_holdings(items, output_file, output_bin)
+    elif output_file.exists() and (
+        not output_bin.exists() or output_bin.stat().st_mtime_ns < output_file.stat().st_mtime_ns
+    ):
+        print(f"warning: {output_bin.name} is out of date, regenerating")
+        write_dataset(items, output_bin)
+    return added
+
+def write_holdings(items, output_file, output_bin):
+    """Write holdings JSON and binary side by side, swapping them in only once both are written"""
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    tmp_bin = output_bin.with_name(output_bin.name + ".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"items": items}, f, indent=2, ensure_ascii=False)
+    with open(tmp_bin, "wb") as f:
+        dump_dataset(items, f)
+    # JSON goes first so a crash in between leaves items.bin older, which the next update repairs
+    os.replace(tmp_file, output_file)
+    os.replace(tmp_bin, output_bin)
+
 def main():
     base_path = Path(__file__).parent.parent
     raw_path = base_path / "data" / "raw"
@@ -73,6 +130,8 @@ def main():
     sb_details_path = base_path / "data" / "raw" / "item_details.csv"
     output_file = base_path / "data" / "items.json"
     output_file_full = base_path / "data" / "all.json"
+    output_bin = base_path / "data" / "items.bin"
+    output_bin_full = base_path / "data" / "all.bin"
     
     # Load data
     print("Loading ownership data...")
@@ -81,6 +140,12 @@ def main():
         sb_holdings += load_sb_holding_data(path)
     print(f"  Loaded {len(sb_holdings)} sb holding records")
     
+    # Keep ownership the proxy merged directly, which never goes through data/raw
+    csv_ids = {entry["id"] for entry in sb_holdings}
+    kept_ids = [id for id in load_held_ids(output_file) if id not in csv_ids]
+    sb_holdings += [{"id": id} for id in kept_ids]
+    print(f"  Kept {len(kept_ids)} additional holdings from {output_file.name}")
+    
     print("Loading item details...")
     sb_details = load_sb_details(sb_details_path)
     print(f"  Loaded {len(sb_details)} sb definitions")
@@ -89,19 +154,18 @@ def main():
     output_full = {"items": [sb for sb in sb_details.values()]}
     with open(output_file_full, "w", encoding="utf-8") as f:
         json.dump(output_full, f, indent=2, ensure_ascii=False)
+    write_dataset(output_full["items"], output_bin_full)
 
     # Merge
     print("\nMerging data...")
     merged = merge_data(sb_holdings, sb_details)
 
     # Write output
-    output_file.parent.mkdir(parents=True, exist_ok=True)
-    output = {"items": merged}
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    write_holdings(merged, output_file, output_bin)
     
     print(f"\n✓ Merged {len(merged)} items")
     print(f"✓ Output written to {output_file}")
+    print(f"✓ Binary dataset written to {output_bin}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Memory-mappable binary format for soul break data
+Written by merge_data.py next to the JSON outputs so tools can skip json.load
+
+Layout (little-endian):
+    header        magic, version, section counts and section offsets
+    string index  (string_count + 1) u32 offsets into the string data
+    string data   deduplicated UTF-8 strings
+    records       record_count fixed-width records of u32 string indices,
+                  followed by a u32 start and u32 count into the element list
+    element list  element_count u32 string indices
+    id index      record_count u32 record positions sorted by id
+"""
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import Mapping
+from pathlib import Path
+
+MAGIC = b"FFRKSB\0\0"
+VERSION = 1
+
+STRING_FIELDS = (
+    "id", "image_url", "character", "name", "name_jp",
+    "tier", "sb_version", "realm", "description"
+)
+FIELDS = STRING_FIELDS + ("elements",)
+
+HEADER = struct.Struct("<8sHHIIIIIIII")
+U32 = struct.Struct("<I")
+RECORD = struct.Struct(f"<{len(STRING_FIELDS) + 2}I")
+
+
+class DatasetFormatError(ValueError):
+    """Raised when a file is not a soul break dataset this reader understands"""
+
+
+def write_dataset(items, filepath):
+    """Write sb dicts to filepath in the binary format, replacing it atomically"""
+    filepath = Path(filepath)
+    tmp_path = filepath.with_name(filepath.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        dump_dataset(items, f)
+    os.replace(tmp_path, filepath)
+
+
+def dump_dataset(items, f):
+    """Write sb dicts in the binary format to an open binary file"""
+    strings = []
+    string_ids = {}
+
+    def intern(value):
+        value = "" if value is None else str(value)
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    records = []
+    elements = []
+    for sb in items:
+        row = [intern(sb.get(field)) for field in STRING_FIELDS]
+        sb_elements = sb.get("elements") or []
+        row += [len(elements), len(sb_elements)]
+        elements += [intern(element) for element in sb_elements]
+        records.append(row)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    string_offsets = [0]
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+
+    id_index = sorted(range(len(records)), key=lambda i: strings[records[i][0]])
+
+    string_index_offset = HEADER.size
+    string_data_offset = string_index_offset + U32.size * len(string_offsets)
+    records_offset = string_data_offset + string_offsets[-1]
+    elements_offset = records_offset + RECORD.size * len(records)
+    id_index_offset = elements_offset + U32.size * len(elements)
+
+    chunks = [
+        HEADER.pack(
+            MAGIC, VERSION, len(FIELDS), len(records), len(strings), len(elements),
+            string_index_offset, string_data_offset, records_offset,
+            elements_offset, id_index_offset
+        ),
+        struct.pack(f"<{len(string_offsets)}I", *string_offsets),
+        *encoded,
+        *(RECORD.pack(*row) for row in records),
+        struct.pack(f"<{len(elements)}I", *elements),
+        struct.pack(f"<{len(id_index)}I", *id_index),
+    ]
+    f.writelines(chunks)
+
+
+class SoulBreak(Mapping):
+    """Read-only view of one record; fields are decoded only when accessed"""
+
+    __slots__ = ("_dataset", "_position")
+
+    def __init__(self, dataset, position):
+        self._dataset = dataset
+        self._position = position
+
+    def __getitem__(self, field):
+        return self._dataset._field(self._position, field)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"SoulBreak(id={self['id']!r}, name={self['name']!r})"
+
+    def to_dict(self):
+        """Decode every field into a plain dict shaped like the JSON items"""
+        return dict(self.items())
+
+
+class SoulBreakDataset:
+    """mmap-backed reader with access by position or by id"""
+
+    def __init__(self, filepath):
+        with open(filepath, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise DatasetFormatError(f"{filepath}: file too short")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header(filepath)
+        except DatasetFormatError:
+            self.close()
+            raise
+
+    def _read_header(self, filepath):
+        (magic, version, field_count, self._count, self._string_count, element_count,
+         self._string_index_offset, self._string_data_offset,
+         self._records_offset, self._elements_offset,
+         self._id_index_offset) = HEADER.unpack_from(self._mm)
+
+        if magic != MAGIC:
+            raise DatasetFormatError(f"{filepath}: not a soul break dataset")
+        if version != VERSION:
+            raise DatasetFormatError(f"{filepath}: unsupported version {version}")
+        if field_count != len(FIELDS):
+            raise DatasetFormatError(
+                f"{filepath}: expected {len(FIELDS)} fields, found {field_count}"
+            )
+
+        sections = [
+            (self._string_index_offset, U32.size * (self._string_count + 1)),
+            (self._records_offset, RECORD.size * self._count),
+            (self._elements_offset, U32.size * element_count),
+            (self._id_index_offset, U32.size * self._count),
+        ]
+        if any(offset + size > len(self._mm) for offset, size in sections):
+            raise DatasetFormatError(f"{filepath}: truncated file")
+
+        string_data_size = U32.unpack_from(
+            self._mm, self._string_index_offset + U32.size * self._string_count
+        )[0]
+        if self._string_data_offset + string_data_size > len(self._mm):
+            raise DatasetFormatError(f"{filepath}: truncated file")
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("soul break position out of range")
+        return SoulBreak(self, position)
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield SoulBreak(self, position)
+
+    def __contains__(self, id):
+        return self._find(str(id)) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+
+    def get(self, id, default=None):
+        """Look up a soul break by id using the sorted id index"""
+        position = self._find(str(id))
+        return default if position is None else SoulBreak(self, position)
+
+    def ids(self):
+        """All ids in record order"""
+        return [self._string(self._record(position)[0]) for position in range(self._count)]
+
+    def _find(self, id):
+        keys = _IdKeys(self)
+        i = bisect_left(keys, id)
+        if i < self._count and keys[i] == id:
+            return U32.unpack_from(self._mm, self._id_index_offset + U32.size * i)[0]
+        return None
+
+    def _record(self, position):
+        return RECORD.unpack_from(self._mm, self._records_offset + RECORD.size * position)
+
+    def _string(self, index):
+        start, end = struct.unpack_from("<2I", self._mm, self._string_index_offset + U32.size * index)
+        base = self._string_data_offset
+        return self._mm[base + start:base + end].decode("utf-8")
+
+    def _field(self, position, field):
+        record = self._record(position)
+        if field == "elements":
+            start, count = record[len(STRING_FIELDS):]
+            indices = struct.unpack_from(f"<{count}I", self._mm, self._elements_offset + U32.size * start)
+            return [self._string(i) for i in indices]
+        try:
+            return self._string(record[STRING_FIELDS.index(field)])
+        except ValueError:
+            raise KeyError(field) from None
+
+
+class _IdKeys:
+    """Sequence of ids in sorted order, decoded on demand for bisect"""
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+
+    def __len__(self):
+        return self._dataset._count
+
+    def __getitem__(self, i):
+        dataset = self._dataset
+        position = U32.unpack_from(dataset._mm, dataset._id_index_offset + U32.size * i)[0]
+        return dataset._string(dataset._record(position)[0])
+
+
+def load_dataset(filepath):
+    """Open a binary dataset written by write_dataset"""
+    return SoulBreakDataset(filepath)